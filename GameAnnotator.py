@@ -0,0 +1,125 @@
+import argparse
+import json
+import math
+from multiprocessing import Pool, Queue
+
+import Position
+import Solver
+import OpeningBook
+
+# Mặc định chỉ chấm từ ply này về cuối ván: tìm kiếm chính xác đắt gấp khoảng 20 lần sau mỗi 4 ply đi ngược
+# (một ván 41 nước mất ~1.4s tới ply 18 nhưng ~28s tới ply 14)
+DEFAULT_MIN_PLY = 18
+
+# Solver riêng của mỗi tiến trình, bảng băm được giữ qua các ván; kết quả gửi về tiến trình chính qua _results
+_solver = None
+_results = None
+
+
+def _init_worker(max_depth, results) -> None:
+    global _solver, _results
+    _solver = Solver.Solver(max_depth)
+    _results = results
+
+
+def _json_score(score):
+    """Điểm ghi ra JSON: ±inf (không có trong JSON chuẩn) được thay bằng ±Solver.PROVEN_SCORE"""
+    if score is None or not math.isinf(score):
+        return score
+    return Solver.Solver.PROVEN_SCORE if score > 0 else -Solver.Solver.PROVEN_SCORE
+
+
+def column_scores(solver, P, guess=None) -> list:
+    """Điểm của cả 7 cột tại vị trí P (theo người chơi hiện tại), None cho cột đã đầy"""
+    scores = [None] * Position.Position.WIDTH
+    for col in range(Position.Position.WIDTH):
+        if not P.can_play(col):
+            continue
+        if P.is_winning_move(col):
+            scores[col] = solver.win_score(P.nb_moves())
+            continue
+        P2 = Position.Position(P)
+        P2.playCol(col)
+        scores[col] = _json_score(-solver.solve(P2, guess=None if guess is None else -guess))
+    return scores
+
+
+def annotate_game(solver, sequence: str, winner: int, min_ply: int = DEFAULT_MIN_PLY):
+    """
+    Chấm điểm mọi cột ở mọi nước của một ván, đi ngược từ nước cuối về `min_ply`
+    để các vị trí cuối ván làm nóng bảng băm cho các vị trí đầu ván.
+    Sinh ra một bản ghi cho mỗi ply ngay khi chấm xong.
+    """
+    prefixes = [Position.Position()]
+    for move in sequence[:-1]:
+        P = Position.Position(prefixes[-1])
+        P.playCol(int(move) - 1)
+        prefixes.append(P)
+
+    guess = None
+    for ply in reversed(range(min_ply, len(sequence))):
+        scores = column_scores(solver, prefixes[ply], guess)
+        move = int(sequence[ply]) - 1
+        best = max(s for s in scores if s is not None)
+        yield {
+            "sequence": sequence,
+            "winner": winner,
+            "ply": ply,
+            "move": move + 1,
+            "scores": scores,
+            "blunder": scores[move] < best,
+        }
+        # Điểm của nước đã chơi ở ply này là ước lượng tốt cho vị trí ngay trước đó
+        guess = -scores[move]
+
+
+def _annotate(args) -> int:
+    sequence, winner, min_ply = args
+    count = 0
+    try:
+        for record in annotate_game(_solver, sequence, winner, min_ply):
+            _results.put(record)
+            count += 1
+    finally:
+        _results.put(None)  # Ván này đã xong (kể cả khi lỗi) để tiến trình chính không chờ mãi
+    return count
+
+
+def annotate_book(book_file: str, output_file: str, workers: int = 2, min_ply: int = DEFAULT_MIN_PLY,
+                  max_depth=None) -> int:
+    """
+    Chấm điểm mọi ván trong book song song theo ván, ghi từng ply ra JSONL ngay khi worker chấm xong.
+    Trả về số dòng đã ghi.
+    """
+    book = OpeningBook.OpeningBook()
+    book.load_from_file(book_file)
+    jobs = [(sequence, data["winner"], min_ply) for sequence, data in book.get_all_sequences().items()]
+
+    count = 0
+    results = Queue()
+    with open(output_file, "w") as f, Pool(workers, initializer=_init_worker, initargs=(max_depth, results)) as pool:
+        pending = pool.map_async(_annotate, jobs, chunksize=1)
+        finished = 0
+        while finished < len(jobs):
+            record = results.get()
+            if record is None:
+                finished += 1
+                continue
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            count += 1
+        pending.get()  # Ném lại lỗi của worker nếu có
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Annotate recorded games with the exact score of every column")
+    parser.add_argument("book", nargs="?", default="battles.txt")
+    parser.add_argument("output", nargs="?", default="annotations.jsonl")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--min-ply", type=int, default=DEFAULT_MIN_PLY,
+                        help=f"stop walking back at this ply (default {DEFAULT_MIN_PLY}; exact solves get ~20x slower every 4 plies)")
+    parser.add_argument("--max-depth", type=int, default=None, help="depth limit (default: exact search)")
+    args = parser.parse_args()
+    n = annotate_book(args.book, args.output, args.workers, args.min_ply, args.max_depth)
+    print(f"Wrote {n} annotated plies into {args.output}")
@@ -0,0 +1,428 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+import Position
+import Solver
+import OpeningBook
+import Metrics
+
+# Solver riêng của mỗi tiến trình worker, được tạo một lần và giữ nóng (bảng băm được dùng lại)
+_solver = None
+
+
+def _init_worker(max_depth) -> None:
+    global _solver
+    _solver = Solver.Solver(max_depth)
+
+
+def _ping() -> bool:
+    return True
+
+
+def _ai_move(sequence: str, ai_player: int, guess=None):
+    """
+    Chạy trong tiến trình worker: tìm nước đi cho AI từ chuỗi nước đã chơi.
+    Worker phục vụ nhiều ván nên điểm ước lượng (guess) do ván gửi kèm, không lấy từ lần gọi trước của Solver.
+    Trả về (cột, điểm của vị trí hoặc None nếu lấy từ book, phần tăng metrics của worker).
+    """
+    P = Position.Position()
+    P.play_sequence(sequence)
+    _solver.new_game()
+    score = None
+    col = _solver.opening_book.find_next_move(P, ai_player)
+    if col is None:
+        col = _solver.best_move(P, guess)
+        score = _solver.previous_score
+    metrics = Metrics.REGISTRY.export()
+    Metrics.REGISTRY.reset()
+    return col, score, metrics
+
+
+class EngineBusy(Exception):
+    """Hàng đợi engine đã đầy"""
+
+
+class EngineFailure(EngineBusy):
+    """Tiến trình solver lỗi khi tính nước đi; ván được trả về trạng thái trước nước của người chơi"""
+
+
+class GameSession:
+    def __init__(self, game_id: str, ai_player: Optional[int]):
+        self.game_id = game_id
+        self.ai_player = ai_player  # None = hai người chơi
+        self.position = Position.Position()
+        self.winner = None  # 1, 2 hoặc 0 (hòa) khi ván kết thúc
+        self.ai_score = None  # Điểm AI tính được ở lượt trước, làm guess cho lượt sau
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def current_player(self) -> int:
+        return 1 + self.position.nb_moves() % 2
+
+    def is_over(self) -> bool:
+        return self.winner is not None
+
+    def is_ai_turn(self) -> bool:
+        return not self.is_over() and self.current_player() == self.ai_player
+
+    def apply(self, col: int) -> None:
+        if self.is_over():
+            raise ValueError("Game is over")
+        if not self.position.can_play(col):
+            raise ValueError(f"Column {col} is not playable")
+        player = self.current_player()
+        winning = self.position.is_winning_move(col)
+        self.position.playCol(col)
+        if winning:
+            self.winner = player
+        elif self.position.nb_moves() == Position.Position.WIDTH * Position.Position.HEIGHT:
+            self.winner = 0
+
+    def undo(self) -> None:
+        """Hoàn tác nước cuối cùng"""
+        self.position.undoCol()
+        self.winner = None
+
+    def state(self) -> dict:
+        return {
+            "game_id": self.game_id,
+            "sequence": self.position.get_played_sequence(),
+            "current_player": self.current_player(),
+            "ai_player": self.ai_player,
+            "winner": self.winner,
+        }
+
+
+class EnginePool:
+    """
+    Nhóm tiến trình solver dùng chung cho mọi ván.
+    Yêu cầu được xếp hàng FIFO; vì mỗi ván chỉ có tối đa một yêu cầu đang chờ nên các ván được phục vụ lần lượt, công bằng.
+    Khi hàng đợi đầy, submit ném EngineBusy thay vì chờ vô hạn.
+    """
+    def __init__(self, workers: int = 2, queue_size: int = 1024, max_depth=10):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.queue = asyncio.Queue(queue_size)
+        self.executor = None
+        self.tasks = []
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._create_executor()
+        # Khởi động trước mọi worker để nước đi đầu tiên không phải chờ tạo Solver
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)))
+        self.tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def _create_executor(self) -> None:
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.max_depth,))
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    async def submit(self, sequence: str, ai_player: int, guess=None):
+        """Trả về (cột, điểm) cho nước của AI"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((sequence, ai_player, guess, future))
+        except asyncio.QueueFull:
+            raise EngineBusy("Engine queue is full")
+        Metrics.queue_depth.set(self.queue.qsize())
+        return await future
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            sequence, ai_player, guess, future = await self.queue.get()
+            Metrics.queue_depth.set(self.queue.qsize())
+            executor = self.executor
+            try:
+                if not future.cancelled():
+                    col, score, metrics = await loop.run_in_executor(executor, _ai_move, sequence, ai_player, guess)
+                    Metrics.REGISTRY.merge(metrics)
+                    if not future.cancelled():
+                        future.set_result((col, score))
+            except BrokenProcessPool as e:
+                # Một worker chết làm hỏng cả pool: tạo pool mới cho các yêu cầu sau.
+                # Các dispatcher khác đang chờ cùng pool cũng nhận lỗi này, chỉ dispatcher đầu tiên thay pool
+                if self.executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._create_executor()
+                if not future.cancelled():
+                    future.set_exception(e)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+
+class BookUpdater:
+    """Gom các ván đã kết thúc và ghi vào opening book theo lô"""
+    def __init__(self, book: OpeningBook.OpeningBook, batch_size: int = 64, interval: float = 5.0):
+        self.book = book
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.task = None
+        self.flush_task = None  # Lần ghi do add() kích hoạt khi đủ lô
+        self.lock = asyncio.Lock()  # Mỗi lúc chỉ một luồng sửa book và ghi battles.txt
+
+    def add(self, sequence: str, winner: int) -> None:
+        self.pending.append((sequence, winner))
+        if len(self.pending) >= self.batch_size and (self.flush_task is None or self.flush_task.done()):
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+            self.flush_task.add_done_callback(self._report)
+
+    async def flush(self) -> int:
+        async with self.lock:
+            entries, self.pending = self.pending, []
+            if not entries:
+                return 0
+            return await asyncio.to_thread(self.book.add_sequences, entries)
+
+    @staticmethod
+    def _report(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error updating opening book: {task.exception()}")
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.flush_task is not None:
+            # Lỗi (nếu có) đã được _report in ra
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error updating opening book: {e}")
+
+
+class GameServer:
+    def __init__(self, workers: int = 2, max_sessions: int = 10000, queue_size: int = 1024, max_depth=10,
+                 session_ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl  # Số giây không hoạt động trước khi ván bị xóa
+        self.sessions = {}
+        self.engine = EnginePool(workers, queue_size, max_depth)
+        self.book_updater = BookUpdater(OpeningBook.OpeningBook())
+        self.sweeper = None
+
+    async def start(self) -> None:
+        await self.engine.start()
+        await self.book_updater.start()
+        self.sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            await asyncio.gather(self.sweeper, return_exceptions=True)
+            self.sweeper = None
+        await self.book_updater.stop()
+        await self.engine.stop()
+
+    def expire_sessions(self) -> int:
+        """
+        Xóa các ván không hoạt động quá session_ttl giây (kể cả ván đã kết thúc), trả về số ván đã xóa.
+        Ván đã kết thúc nhưng còn mới chỉ bị xóa sớm trong create_session khi hết chỗ.
+        """
+        now = time.monotonic()
+        expired = [game_id for game_id, session in self.sessions.items()
+                   if not session.lock.locked() and now - session.last_active > self.session_ttl]
+        for game_id in expired:
+            del self.sessions[game_id]
+        return len(expired)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.session_ttl / 10)
+            self.expire_sessions()
+
+    def get_session(self, game_id: str) -> GameSession:
+        session = self.sessions.get(game_id)
+        if session is None:
+            raise KeyError(game_id)
+        session.touch()
+        return session
+
+    def remove_session(self, game_id: str) -> bool:
+        return self.sessions.pop(game_id, None) is not None
+
+    async def create_session(self, ai_player: Optional[int] = 2) -> GameSession:
+        if len(self.sessions) >= self.max_sessions:
+            # Giải phóng các ván đã kết thúc trước khi từ chối
+            for game_id in [g for g, s in self.sessions.items() if s.is_over()]:
+                del self.sessions[game_id]
+            self.expire_sessions()
+            if len(self.sessions) >= self.max_sessions:
+                raise EngineBusy("Too many sessions")
+        if ai_player == 1:
+            self._reserve_engine()
+        session = GameSession(uuid.uuid4().hex, ai_player)
+        self.sessions[session.game_id] = session
+        try:
+            async with session.lock:
+                await self._play_ai(session)
+        except BaseException:
+            # Ván chưa bao giờ được giao cho người chơi: bỏ hẳn
+            self.remove_session(session.game_id)
+            raise
+        return session
+
+    async def play(self, session: GameSession, col: int) -> dict:
+        async with session.lock:
+            if session.is_ai_turn():
+                raise ValueError("Not your turn")
+            session.touch()
+            session.apply(col)
+            self._record(session)
+            if session.is_ai_turn():
+                try:
+                    self._reserve_engine()
+                    await self._play_ai(session)
+                except BaseException:
+                    # Hàng đợi đầy, yêu cầu bị hủy (client ngắt kết nối) hoặc worker lỗi: hoàn tác nước của người chơi
+                    # để ván không bị kẹt ở lượt AI, người chơi có thể gửi lại nước đi
+                    session.undo()
+                    raise
+            return session.state()
+
+    def _reserve_engine(self) -> None:
+        # Kiểm tra ngay trước khi gửi yêu cầu; không có await xen giữa nên chỗ trống vẫn còn khi submit
+        if self.engine.queue.full():
+            raise EngineBusy("Engine queue is full")
+
+    async def _play_ai(self, session: GameSession) -> None:
+        if session.is_ai_turn():
+            try:
+                col, score = await self.engine.submit(
+                    session.position.get_played_sequence(), session.ai_player, session.ai_score)
+            except EngineBusy:
+                raise
+            except Exception as e:
+                raise EngineFailure(f"Engine failed: {e}") from e
+            session.apply(col)
+            session.ai_score = score
+            self._record(session)
+
+    def _record(self, session: GameSession) -> None:
+        if session.is_over():
+            self.book_updater.add(session.position.get_played_sequence(), session.winner)
+
+
+class NewGame(BaseModel):
+    ai_player: Optional[int] = 2
+
+
+class Move(BaseModel):
+    col: int
+
+
+def create_app(server: Optional[GameServer] = None) -> FastAPI:
+    server = server or GameServer()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await server.start()
+        yield
+        await server.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.server = server
+
+    def lookup(game_id: str) -> GameSession:
+        try:
+            return server.get_session(game_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Game not found")
+
+    @app.post("/games")
+    async def new_game(body: NewGame = NewGame()):
+        if body.ai_player not in {None, 1, 2}:
+            raise HTTPException(status_code=400, detail="ai_player must be 1, 2 or null")
+        try:
+            session = await server.create_session(body.ai_player)
+        except EngineBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        return session.state()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return Metrics.REGISTRY.render()
+
+    @app.get("/games/{game_id}")
+    async def get_game(game_id: str):
+        return lookup(game_id).state()
+
+    @app.delete("/games/{game_id}")
+    async def delete_game(game_id: str):
+        return {"deleted": server.remove_session(game_id)}
+
+    @app.post("/games/{game_id}/moves")
+    async def play_move(game_id: str, body: Move):
+        session = lookup(game_id)
+        try:
+            return await server.play(session, body.col)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except EngineBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    @app.websocket("/games/{game_id}/ws")
+    async def game_socket(websocket: WebSocket, game_id: str):
+        try:
+            session = server.get_session(game_id)
+        except KeyError:
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        await websocket.send_json(session.state())
+        try:
+            while True:
+                message = await websocket.receive_json()
+                try:
+                    await websocket.send_json(await server.play(session, int(message["col"])))
+                except (ValueError, KeyError, TypeError) as e:
+                    await websocket.send_json({"error": str(e)})
+                except EngineBusy as e:
+                    await websocket.send_json({"error": str(e), "retry": True})
+        except WebSocketDisconnect:
+            pass
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
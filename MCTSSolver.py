@@ -0,0 +1,141 @@
+import math
+import time
+import numpy as np
+import Position
+import PositionBatch
+
+
+class MCTSNode:
+    def __init__(self, position, parent=None, col=None, terminal_value=None):
+        self.position = position
+        self.parent = parent
+        self.col = col
+        self.children = {}
+        self.untried = [c for c in (3, 2, 4, 1, 5, 0, 6) if position.can_play(c)]
+        # Số lần lặp qua nút: cả batch playout tính là một lần, để số hạng khám phá của UCT không phụ thuộc batch_size
+        self.visits = 0
+        # Tổng điểm trung bình mỗi batch (thắng = 1, hòa = 0.5) của người chơi vừa đi vào nút này
+        self.value = 0.0
+        self.terminal_value = terminal_value
+
+    def uct_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.value / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTSSolver:
+    """
+    Monte Carlo Tree Search (UCT) dùng chung giao diện best_move với Solver.
+    Mỗi lần mở rộng nút chạy một batch playout ngẫu nhiên bằng PositionBatch và cập nhật cây một lần với điểm trung bình.
+    `exploration` là hằng số c của UCT: value/visits + c * sqrt(ln(visits cha) / visits), điểm trong [0, 1],
+    visits đếm theo batch nên c không phụ thuộc batch_size. sqrt(2) theo lý thuyết; nhỏ hơn (khoảng 0.5-1) tham hơn.
+    """
+    def __init__(self, time_budget: float = 1.0, batch_size: int = 64, exploration: float = 1.0, seed=None):
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.rng = np.random.default_rng(seed)
+        self.root = None
+        self.playout_count = 0
+        self.column_masks = np.array([Position.Position.column_mask(c) for c in range(Position.Position.WIDTH)], dtype=np.uint64)
+
+    def set_time_budget(self, time_budget: float) -> None:
+        self.time_budget = time_budget
+
+    def reset(self) -> None:
+        self.root = None
+
+    def best_move(self, P, time_budget=None) -> int:
+        """Trả về cột tốt nhất (0-indexed) cho người chơi hiện tại"""
+        for col in range(Position.Position.WIDTH):
+            if P.can_play(col) and P.is_winning_move(col):
+                return col
+
+        root = self._find_root(P)
+        budget = self.time_budget if time_budget is None else time_budget
+        deadline = time.perf_counter() + budget
+        while True:
+            self._iterate(root)
+            if time.perf_counter() >= deadline or root.terminal_value is not None:
+                break
+
+        if not root.children:
+            return root.untried[0]
+        return max(root.children.values(), key=lambda child: child.visits).col
+
+    def _find_root(self, P):
+        """Tái sử dụng cây cũ nếu P là hậu duệ (tối đa 2 nước) của gốc trước đó"""
+        key = P.key()
+        if self.root is not None:
+            frontier = [self.root]
+            for _ in range(3):
+                for node in frontier:
+                    if node.position.nb_moves() == P.nb_moves() and node.position.key() == key:
+                        node.parent = None
+                        self.root = node
+                        return node
+                frontier = [child for node in frontier for child in node.children.values()]
+        self.root = MCTSNode(Position.Position(P))
+        return self.root
+
+    def _iterate(self, root):
+        node = root
+        while node.terminal_value is None and not node.untried and node.children:
+            node = node.uct_child(self.exploration)
+
+        if node.terminal_value is None and node.untried:
+            node = self._expand(node)
+
+        if node.terminal_value is not None:
+            value = node.terminal_value
+        else:
+            # Kết quả playout tính theo người chơi sắp đi tại nút lá
+            value = 1.0 - self._rollout(node.position) / self.batch_size
+
+        while node is not None:
+            node.visits += 1
+            node.value += value
+            value = 1.0 - value
+            node = node.parent
+
+    def _expand(self, node):
+        col = node.untried.pop(0)
+        P = node.position
+        terminal_value = None
+        if P.is_winning_move(col):
+            terminal_value = 1.0
+        elif P.nb_moves() + 1 == Position.Position.WIDTH * Position.Position.HEIGHT:
+            terminal_value = 0.5
+        P2 = Position.Position(P)
+        P2.playCol(col)
+        child = MCTSNode(P2, node, col, terminal_value)
+        node.children[col] = child
+        return child
+
+    def _rollout(self, P) -> float:
+        """Chạy batch_size playout ngẫu nhiên song song, trả về tổng điểm của người chơi sắp đi"""
+        n = self.batch_size
+        batch = PositionBatch.PositionBatch(n)
+        batch.current_position[:] = P.current_position
+        batch.mask[:] = P.mask
+        batch.moves[:] = P.nb_moves()
+
+        result = np.full(n, 0.5)
+        active = np.ones(n, dtype=bool)
+        for ply in range(Position.Position.WIDTH * Position.Position.HEIGHT - P.nb_moves()):
+            win_now = active & batch.canWinNext()
+            result[win_now] = 1.0 if ply % 2 == 0 else 0.0
+            active &= ~win_now
+            if not active.any():
+                break
+
+            possible = batch.possible()
+            playable = (possible[:, None] & self.column_masks[None, :]) != 0
+            r = self.rng.random(playable.shape)
+            r[~playable] = -1.0
+            move = possible & self.column_masks[np.argmax(r, axis=1)]
+            batch.play(move, active)
+
+        self.playout_count += n
+        return float(result.sum())
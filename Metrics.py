@@ -0,0 +1,173 @@
+import bisect
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+    def export(self):
+        return self.value
+
+    def merge(self, state) -> None:
+        self.value += state
+
+    def reset(self) -> None:
+        self.value = 0
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function=None, local=False, combine=None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.function = function  # Nếu có, giá trị được tính lúc xuất thay vì set()
+        self.local = local  # Giá trị riêng của tiến trình: worker không gửi về để ghi đè giá trị của tiến trình chính
+        self.combine = combine  # Hàm gộp giá trị cũ với giá trị worker gửi về (ví dụ max), None = lấy giá trị mới
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def samples(self):
+        return [(self.name, self.function() if self.function else self.value)]
+
+    def export(self):
+        return None if self.function or self.local else self.value
+
+    def merge(self, state) -> None:
+        if state is None:
+            return
+        self.value = state if self.combine is None else self.combine(self.value, state)
+
+    def reset(self) -> None:
+        pass
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.reset()
+
+    def observe(self, value) -> None:
+        # Đếm theo từng khoảng (không cộng dồn), cộng dồn khi xuất
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((f'{self.name}_bucket{{le="{bound}"}}', total))
+        total += self.counts[-1]
+        result.append((f'{self.name}_bucket{{le="+Inf"}}', total))
+        result.append((f"{self.name}_sum", self.sum))
+        result.append((f"{self.name}_count", total))
+        return result
+
+    def export(self):
+        return list(self.counts), self.sum
+
+    def merge(self, state) -> None:
+        counts, total = state
+        for i, count in enumerate(counts):
+            self.counts[i] += count
+        self.sum += total
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+
+
+class Registry:
+    """
+    Tập các metric dạng Prometheus. Cập nhật chỉ là phép cộng trên int Python, không khóa;
+    mỗi tiến trình có registry riêng, tiến trình worker gửi phần tăng về bằng export/reset và merge.
+    """
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, function=None, local=False, combine=None) -> Gauge:
+        return self.register(Gauge(name, help, function, local, combine))
+
+    def histogram(self, name: str, help: str, buckets) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def export(self) -> dict:
+        return {name: metric.export() for name, metric in self.metrics.items()}
+
+    def merge(self, states: dict) -> None:
+        for name, state in states.items():
+            if name in self.metrics:
+                self.metrics[name].merge(state)
+
+    def reset(self) -> None:
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def render(self) -> str:
+        """Định dạng văn bản Prometheus (text exposition format 0.0.4)"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename: str) -> bool:
+        try:
+            with open(filename, "w") as f:
+                f.write(self.render())
+            return True
+        except IOError as e:
+            print(f"Error saving {filename}: {e}")
+            return False
+
+
+REGISTRY = Registry()
+
+solves = REGISTRY.counter("connect4_solves_total", "Number of Solver.solve requests")
+nodes = REGISTRY.counter("connect4_nodes_total", "Nodes searched by Solver.negamax")
+solve_seconds = REGISTRY.histogram(
+    "connect4_solve_seconds", "Solver.solve latency in seconds",
+    [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60])
+solve_nodes = REGISTRY.histogram(
+    "connect4_solve_nodes", "Nodes searched per Solver.solve request",
+    [10, 100, 1000, 10000, 100000, 1000000, 10000000])
+table_hits = REGISTRY.counter("connect4_table_hits_total", "Transposition table probes that found the key")
+table_misses = REGISTRY.counter("connect4_table_misses_total", "Transposition table probes that missed")
+table_hit_ratio = REGISTRY.gauge(
+    "connect4_table_hit_ratio", "Transposition table hit ratio since start",
+    lambda: table_hits.value / max(1, table_hits.value + table_misses.value))
+table_fill_ratio = REGISTRY.gauge(
+    "connect4_table_fill_ratio", "Fraction of transposition table slots in use (largest across solver processes)",
+    combine=max)
+book_hits = REGISTRY.counter("connect4_book_hits_total", "Opening book lookups that returned a move")
+book_misses = REGISTRY.counter("connect4_book_misses_total", "Opening book lookups without a move")
+book_hit_ratio = REGISTRY.gauge(
+    "connect4_book_hit_ratio", "Opening book hit ratio since start",
+    lambda: book_hits.value / max(1, book_hits.value + book_misses.value))
+queue_depth = REGISTRY.gauge("connect4_engine_queue_depth", "AI requests waiting for a solver process", local=True)
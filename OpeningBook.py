@@ -1,5 +1,6 @@
 from typing import Optional
 from Position import Position
+import Metrics
 
 class OpeningBook:
     def __init__(self):
@@ -15,14 +16,17 @@ class OpeningBook:
         """Find the next move from the opening book"""
         current_sequence = position.get_played_sequence()
         if len(current_sequence) == 0 and ai_player == 1:
+            Metrics.book_hits.inc()
             return self.get_first_move()
 
         # Check battles.txt
         battle_move = self.check_battles_book(current_sequence, ai_player)
         if battle_move is not None and position.can_play(battle_move):
             print(f"Using battles.txt move: {battle_move}")
+            Metrics.book_hits.inc()
             return battle_move
 
+        Metrics.book_misses.inc()
         return None
 
     def check_battles_book(self, current_sequence: str, ai_player: int) -> Optional[int]:
@@ -56,28 +60,44 @@ class OpeningBook:
 
     def add_sequence(self, sequence: str, winner: int) -> None:
         """Add a winning sequence to the opening book"""
+        if self.validate_sequence(sequence, winner):
+            self.winning_sequences[sequence] = {"winner": winner}
+            self.save_to_file(self.book_file)
+
+    def add_sequences(self, entries) -> int:
+        """Add many (sequence, winner) pairs and save the book once, return the number added"""
+        added = 0
+        for sequence, winner in entries:
+            if self.validate_sequence(sequence, winner):
+                self.winning_sequences[sequence] = {"winner": winner}
+                added += 1
+        if added:
+            self.save_to_file(self.book_file)
+        return added
+
+    def validate_sequence(self, sequence: str, winner: int) -> bool:
+        """Check that a sequence is playable and ends with the announced winner"""
         if winner not in {0, 1, 2} or not all(c in '1234567' for c in sequence):
             print(f"Warning: Invalid sequence {sequence} or winner {winner}")
-            return
+            return False
         position = Position()
         try:
             for move in sequence:
                 col = int(move) - 1
                 if not position.can_play(col):
                     print(f"Warning: Invalid move in sequence {sequence}")
-                    return
+                    return False
                 position.playCol(col)
             if winner == 1 and not position.check_win(position.current_position):
                 print(f"Warning: Sequence {sequence} does not lead to Player 1 win")
-                return
+                return False
             if winner == 2 and not position.check_win(position.mask & ~position.current_position):
                 print(f"Warning: Sequence {sequence} does not lead to Player 2 win")
-                return
+                return False
         except ValueError as e:
             print(f"Warning: Invalid sequence {sequence}: {e}")
-            return
-        self.winning_sequences[sequence] = {"winner": winner}
-        self.save_to_file(self.book_file)
+            return False
+        return True
 
     def remove_sequence(self, sequence: str) -> bool:
         """Remove a sequence from the opening book"""
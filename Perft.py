@@ -0,0 +1,127 @@
+import argparse
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import Position
+
+# Số vị trí phân biệt sau n nước (OEIS A212693), ván đã thắng không đi tiếp
+KNOWN_UNIQUE_COUNTS = [1, 7, 49, 238, 1120, 4263, 16422, 54859, 184275, 558186, 1662623, 4568683, 12236101]
+
+
+def _position(current: int, mask: int, moves: int):
+    P = Position.Position()
+    P.current_position = np.uint64(current)
+    P.mask = np.uint64(mask)
+    P.moves = moves
+    return P
+
+
+def children(P):
+    """
+    Sinh các nước đi của P, trả về danh sách (vị trí con, có phải nước thắng).
+    Đồng thời kiểm tra can_play khớp với possible().
+    """
+    result = []
+    possible = P.possible()
+    for col in range(Position.Position.WIDTH):
+        move = possible & Position.Position.column_mask(col)
+        assert P.can_play(col) == (move != 0), f"can_play({col}) does not match possible()"
+        if move == 0:
+            continue
+        winning = P.is_winning_move(col)
+        P2 = Position.Position(P)
+        P2.play(move)
+        result.append((P2, winning))
+    return result
+
+
+def perft(P, depth: int) -> int:
+    """Số lá ở độ sâu `depth` của cây trò chơi (không gộp vị trí trùng)"""
+    if depth == 0:
+        return 1
+    count = 0
+    for P2, winning in children(P):
+        if winning:
+            count += depth == 1
+        else:
+            count += perft(P2, depth - 1)
+    return count
+
+
+def _perft_job(args) -> int:
+    current, mask, moves, depth = args
+    return perft(_position(current, mask, moves), depth)
+
+
+def perft_parallel(depth: int, workers: int = 2, split_depth: int = 2) -> int:
+    """Chia cây tại split_depth và đếm các cây con trên nhiều tiến trình"""
+    split_depth = min(split_depth, depth)
+    frontier = [(Position.Position(), False)]
+    finished = 0
+    for ply in range(split_depth):
+        next_frontier = []
+        for P, _ in frontier:
+            for P2, winning in children(P):
+                if not winning:
+                    next_frontier.append((P2, False))
+                elif ply == depth - 1:
+                    finished += 1
+        frontier = next_frontier
+    jobs = [(int(P.current_position), int(P.mask), P.nb_moves(), depth - split_depth) for P, _ in frontier]
+    with Pool(workers) as pool:
+        return finished + sum(pool.imap_unordered(_perft_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def _expand_job(chunk):
+    """Mở rộng một phần frontier, trả về (các con chưa kết thúc, các con vừa thắng) dạng (current, mask)"""
+    alive, won = set(), set()
+    for current, mask, moves in chunk:
+        for P2, winning in children(_position(current, mask, moves)):
+            (won if winning else alive).add((int(P2.current_position), int(P2.mask)))
+    return alive, won
+
+
+def perft_unique(depth: int, workers: int = 2, chunk_size: int = 4096) -> list:
+    """Số vị trí phân biệt sau mỗi nước từ 0 đến depth (gộp chuyển vị theo từng tầng)"""
+    counts = [1]
+    frontier = [(0, 0)]
+    with Pool(workers) as pool:
+        for ply in range(depth):
+            items = [(current, mask, ply) for current, mask in frontier]
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+            alive, won = set(), set()
+            for chunk_alive, chunk_won in pool.imap_unordered(_expand_job, chunks):
+                alive |= chunk_alive
+                won |= chunk_won
+            counts.append(len(alive) + len(won))
+            frontier = list(alive)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft move-generation benchmark for Position")
+    parser.add_argument("depth", type=int, nargs="?", default=7)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--unique", action="store_true", help="deduplicate transpositions and compare with known counts")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.unique:
+        counts = perft_unique(args.depth, args.workers)
+        elapsed = time.perf_counter() - start
+        ok = True
+        for ply, count in enumerate(counts):
+            expected = KNOWN_UNIQUE_COUNTS[ply] if ply < len(KNOWN_UNIQUE_COUNTS) else None
+            status = "?" if expected is None else ("OK" if count == expected else "MISMATCH")
+            ok &= status != "MISMATCH"
+            print(f"ply {ply:2d}: {count:12d}  expected {expected}  {status}")
+        total = sum(counts)
+    else:
+        total = perft_parallel(args.depth, args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"perft({args.depth}) = {total}")
+        ok = True
+    print(f"{total} positions in {elapsed:.2f}s ({total / elapsed:.0f} positions/s)")
+    if not ok:
+        raise SystemExit(1)
@@ -7,6 +7,27 @@ def bottom(width, height):
     return mask
 
 
+def lines(width, height):
+    """Tất cả các hàng 4 ô (ngang, dọc, chéo) dưới dạng bitmask int"""
+    result = []
+    for x in range(width):
+        for y in range(height):
+            for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                if 0 <= x + 3*dx < width and 0 <= y + 3*dy < height:
+                    result.append(sum(1 << (x + i*dx) * (height + 1) + y + i*dy for i in range(4)))
+    return result
+
+
+def cell_lines(width, height, all_lines):
+    """Chỉ số bit của ô -> các hàng 4 đi qua ô đó"""
+    index = [[] for _ in range(width * (height + 1))]
+    for i, line in enumerate(all_lines):
+        for bit in range(width * (height + 1)):
+            if line >> bit & 1:
+                index[bit].append(i)
+    return [tuple(ids) for ids in index]
+
+
 class Position:
     WIDTH = 7 
     HEIGHT = 6 
@@ -14,23 +35,132 @@ class Position:
     MAX_SCORE = (WIDTH*HEIGHT+1)//2 - 3
     bottom_mask = bottom(WIDTH, HEIGHT)
     board_mask = bottom_mask * ((np.uint64(1) << HEIGHT)-1) 
+    LINES = lines(WIDTH, HEIGHT)
+    CELL_LINES = cell_lines(WIDTH, HEIGHT, LINES)
 
-    def __init__(self, other=None):
+    def __init__(self, other=None, track_threats=False):
         if other:
             self.current_position = np.uint64(other.current_position)
             self.mask = np.uint64(other.mask)
             self.moves = other.moves
             self._played_sequence = list(other._played_sequence)  # Sao chép danh sách nước đi
+            if other.line_counts is not None:
+                self.line_counts = [list(other.line_counts[0]), list(other.line_counts[1])]
+                self.open_lines = list(other.open_lines)
+                self.threat_lines = [list(other.threat_lines[0]), list(other.threat_lines[1])]
+                self.threats = [list(other.threats[0]), list(other.threats[1])]
+            else:
+                self.line_counts = None
         else:
             self.current_position = np.uint64(0)
             self.mask = np.uint64(0)
             self.moves = 0
             self._played_sequence = []
+            self.line_counts = None
+        if track_threats and self.line_counts is None:
+            self.enable_threat_tracking()
+
+    def enable_threat_tracking(self):
+        """
+        Bật đếm tăng dần theo người chơi (0 = đi trước, 1 = đi sau):
+        line_counts[p][i]: số quân của p trên hàng 4 thứ i
+        open_lines[p]: số hàng 4 có quân của p và không có quân đối thủ
+        threat_lines[p][b]: số hàng 4 có 3 quân của p và ô còn lại (trống) là bit b
+        threats[p][r]: số ô đe dọa của p (ô trống có threat_lines > 0), r = 0 nếu ô ở hàng lẻ (1, 3, 5), 1 nếu ở hàng chẵn.
+        Đếm theo ô như compute_winning_position: ô chung của hai hàng chỉ tính một lần.
+        """
+        mask = int(self.mask)
+        current = int(self.current_position)
+        stones = [0, 0]
+        stones[self.moves % 2] = current
+        stones[1 - self.moves % 2] = current ^ mask
+        self.line_counts = [[Position.popcount(line & stones[p]) for line in Position.LINES] for p in (0, 1)]
+        self.open_lines = [0, 0]
+        self.threat_lines = [[0] * len(Position.CELL_LINES), [0] * len(Position.CELL_LINES)]
+        self.threats = [[0, 0], [0, 0]]
+        for i, line in enumerate(Position.LINES):
+            for p in (0, 1):
+                if self.line_counts[p][i] and not self.line_counts[1 - p][i]:
+                    self.open_lines[p] += 1
+                    if self.line_counts[p][i] == 3:
+                        self._add_threat(p, line & ~mask)
+
+    def _add_threat(self, p, cell):
+        bit = cell.bit_length() - 1
+        self.threat_lines[p][bit] += 1
+        if self.threat_lines[p][bit] == 1:
+            self.threats[p][Position.row_parity(cell)] += 1
+
+    def _remove_threat(self, p, cell):
+        bit = cell.bit_length() - 1
+        self.threat_lines[p][bit] -= 1
+        if self.threat_lines[p][bit] == 0:
+            self.threats[p][Position.row_parity(cell)] -= 1
 
     def play(self, move):
         self.current_position ^= self.mask
         self.mask |= move
         self.moves += 1
+        if self.line_counts is not None:
+            self._add_stone((self.moves - 1) % 2, int(move))
+
+    def undo(self, move):
+        """Hoàn tác play(move)"""
+        if self.line_counts is not None:
+            self._remove_stone((self.moves - 1) % 2, int(move))
+        self.mask ^= move
+        self.current_position ^= self.mask
+        self.moves -= 1
+
+    def undoCol(self):
+        """Hoàn tác nước playCol cuối cùng"""
+        col = self._played_sequence.pop()
+        self.undo(self.mask & self.column_mask(col) & ~(self.mask >> 1))
+
+    def _add_stone(self, p, move):
+        # Gọi sau khi mask đã có ô move
+        o = 1 - p
+        counts, other = self.line_counts[p], self.line_counts[o]
+        mask = int(self.mask)
+        for i in Position.CELL_LINES[move.bit_length() - 1]:
+            a, b = counts[i], other[i]
+            counts[i] = a + 1
+            if b == 0:
+                if a == 0:
+                    self.open_lines[p] += 1
+                elif a == 2:
+                    self._add_threat(p, Position.LINES[i] & ~mask)
+                elif a == 3:
+                    self._remove_threat(p, move)
+            elif a == 0:
+                self.open_lines[o] -= 1
+                if b == 3:
+                    self._remove_threat(o, move)
+
+    def _remove_stone(self, p, move):
+        # Gọi trước khi bỏ ô move khỏi mask
+        o = 1 - p
+        counts, other = self.line_counts[p], self.line_counts[o]
+        mask = int(self.mask)
+        for i in Position.CELL_LINES[move.bit_length() - 1]:
+            a, b = counts[i] - 1, other[i]
+            counts[i] = a
+            if b == 0:
+                if a == 0:
+                    self.open_lines[p] -= 1
+                elif a == 2:
+                    self._remove_threat(p, Position.LINES[i] & ~mask)
+                elif a == 3:
+                    self._add_threat(p, move)
+            elif a == 0:
+                self.open_lines[o] += 1
+                if b == 3:
+                    self._add_threat(o, move)
+
+    def parity_balance(self):
+        """Như ThreatAnalyzer.parity_score: người đi trước cần đe dọa hàng lẻ, người đi sau hàng chẵn"""
+        p = self.moves % 2
+        return self.threats[p][p] - self.threats[1 - p][1 - p]
 
     def play_sequence(self, seq):
         for i, c in enumerate(seq):
@@ -41,6 +171,16 @@ class Position:
         return len(seq)
 
     def canWinNext(self):
+        if self.line_counts is not None:
+            # Có ô đe dọa của người chơi hiện tại trong số (tối đa WIDTH) ô đi được: không cần compute_winning_position
+            threat_lines = self.threat_lines[self.moves % 2]
+            possible = int(self.possible())
+            while possible:
+                cell = possible & -possible
+                if threat_lines[cell.bit_length() - 1]:
+                    return True
+                possible ^= cell
+            return False
         return self.winning_position() & self.possible() != 0
 
     def nb_moves(self):
@@ -84,6 +224,19 @@ class Position:
         return possible_mask & ~(oppoment_win >> 1)
     
     def moveScore(self, move):
+        if self.line_counts is not None:
+            # Số ô đe dọa của người chơi hiện tại sau nước move: ô cũ cộng ô mới của các hàng 2 -> 3 quân qua ô move
+            p = self.moves % 2
+            counts, other, threat_lines = self.line_counts[p], self.line_counts[1 - p], self.threat_lines[p]
+            move = int(move)
+            filled = int(self.mask) | move
+            new_cells = 0
+            for i in Position.CELL_LINES[move.bit_length() - 1]:
+                if counts[i] == 2 and other[i] == 0:
+                    cell = Position.LINES[i] & ~filled
+                    if not threat_lines[cell.bit_length() - 1]:
+                        new_cells |= cell
+            return sum(self.threats[p]) + Position.popcount(new_cells)
         return self.popcount(self.compute_winning_position(self.current_position | move, self.mask))
 
     def can_play(self, col):
@@ -122,6 +275,11 @@ class Position:
     def popcount(x):
         return bin(x).count('1')
 
+    @staticmethod
+    def row_parity(cell):
+        """0 nếu ô (bitmask một bit) nằm ở hàng lẻ 1, 3, 5 (đếm từ 1), 1 nếu ở hàng chẵn"""
+        return (int(cell).bit_length() - 1) % (Position.HEIGHT + 1) % 2
+
     @staticmethod
     def compute_winning_position(position, mask):
         # Vertical
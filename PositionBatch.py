@@ -0,0 +1,190 @@
+import numpy as np
+import Position
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(x):
+    """Đếm số bit 1 của từng phần tử trong mảng uint64"""
+    x = np.asarray(x, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x).astype(np.int32)
+    return _POPCOUNT_TABLE[x.reshape(-1, 1).view(np.uint8)].sum(axis=1, dtype=np.int32).reshape(x.shape)
+
+
+class PositionBatch:
+    """
+    Nhiều bàn cờ lưu dạng struct-of-arrays: mỗi trường của Position là một mảng
+    NumPy liền kề, mọi phép toán bitboard chạy một lần cho cả batch.
+    """
+    WIDTH = Position.Position.WIDTH
+    HEIGHT = Position.Position.HEIGHT
+    bottom_mask = Position.Position.bottom_mask
+    board_mask = Position.Position.board_mask
+
+    def __init__(self, size: int = 0):
+        self.current_position = np.zeros(size, dtype=np.uint64)
+        self.mask = np.zeros(size, dtype=np.uint64)
+        self.moves = np.zeros(size, dtype=np.int32)
+        # Cột đã chơi (0-indexed) theo từng nước, chỉ được ghi bởi play_col
+        self.history = np.zeros((size, self.WIDTH * self.HEIGHT), dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    def copy(self) -> "PositionBatch":
+        other = PositionBatch(0)
+        other.current_position = self.current_position.copy()
+        other.mask = self.mask.copy()
+        other.moves = self.moves.copy()
+        other.history = self.history.copy()
+        return other
+
+    def select(self, index) -> "PositionBatch":
+        """Trả về batch con (bản sao) theo chỉ số hoặc mặt nạ boolean"""
+        other = PositionBatch(0)
+        other.current_position = self.current_position[index]
+        other.mask = self.mask[index]
+        other.moves = self.moves[index]
+        other.history = self.history[index]
+        return other
+
+    @classmethod
+    def from_positions(cls, positions) -> "PositionBatch":
+        positions = list(positions)
+        batch = cls(len(positions))
+        for i, P in enumerate(positions):
+            batch.current_position[i] = P.current_position
+            batch.mask[i] = P.mask
+            batch.moves[i] = P.nb_moves()
+            seq = P._played_sequence
+            if isinstance(seq, str):
+                seq = [int(c) - 1 for c in seq]
+            batch.history[i, :len(seq)] = seq
+        return batch
+
+    @classmethod
+    def from_sequences(cls, sequences) -> "PositionBatch":
+        sequences = list(sequences)
+        batch = cls(len(sequences))
+        batch.play_sequences(sequences)
+        return batch
+
+    def to_positions(self) -> list:
+        positions = []
+        for i in range(len(self)):
+            P = Position.Position()
+            P.current_position = np.uint64(self.current_position[i])
+            P.mask = np.uint64(self.mask[i])
+            P.moves = int(self.moves[i])
+            P._played_sequence = [int(c) for c in self.history[i, :self.moves[i]]]
+            positions.append(P)
+        return positions
+
+    def to_sequences(self) -> list:
+        """Chuỗi nước đi (1-indexed) của từng bàn, chỉ đúng khi mọi nước được chơi qua play_col"""
+        digits = (self.history + ord('1')).astype(np.uint8)
+        return [digits[i, :self.moves[i]].tobytes().decode() for i in range(len(self))]
+
+    def play_sequences(self, sequences) -> np.ndarray:
+        """
+        Chơi song song các chuỗi nước đi, giống Position.play_sequence: mỗi chuỗi
+        dừng ở nước không hợp lệ hoặc nước thắng đầu tiên.
+        Trả về số nước đã chơi của từng chuỗi.
+        """
+        sequences = list(sequences)
+        assert len(sequences) == len(self)
+        n = len(sequences)
+        length = max((len(s) for s in sequences), default=0)
+        cols = np.full((n, length), -1, dtype=np.int64)
+        for i, s in enumerate(sequences):
+            if s:
+                cols[i, :len(s)] = np.frombuffer(s.encode(), dtype=np.uint8).astype(np.int64) - ord('1')
+
+        played = np.zeros(n, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+        for ply in range(length):
+            col = cols[:, ply]
+            valid = active & (col >= 0) & (col < self.WIDTH)
+            safe_col = np.where(valid, col, 0)
+            valid &= self.can_play(safe_col)
+            valid &= (self.winning_position() & self.possible() & self.column_mask(safe_col)) == 0
+            active = valid
+            if not active.any():
+                break
+            self.play_col(safe_col, active)
+            played += active
+        return played
+
+    def play(self, move, active=None) -> None:
+        """Chơi nước `move` (bitmask) trên các bàn được chọn bởi `active`"""
+        move = np.asarray(move, dtype=np.uint64)
+        if active is None:
+            self.current_position ^= self.mask
+            self.mask |= move
+            self.moves += 1
+        else:
+            self.current_position = np.where(active, self.current_position ^ self.mask, self.current_position)
+            self.mask = np.where(active, self.mask | move, self.mask)
+            self.moves += active
+
+    def play_col(self, col, active=None) -> None:
+        col = np.broadcast_to(np.asarray(col, dtype=np.int64), self.moves.shape)
+        rows = np.arange(len(self)) if active is None else np.flatnonzero(active)
+        self.history[rows, self.moves[rows]] = col[rows]
+        self.play((self.mask + self.bottom_mask_col(col)) & self.column_mask(col), active)
+
+    def nb_moves(self) -> np.ndarray:
+        return self.moves
+
+    def key(self) -> np.ndarray:
+        return self.current_position + self.mask
+
+    def can_play(self, col) -> np.ndarray:
+        col = np.asarray(col, dtype=np.int64)
+        return (self.mask & self.top_mask_col(col)) == 0
+
+    def possible(self) -> np.ndarray:
+        return (self.mask + self.bottom_mask) & self.board_mask
+
+    def winning_position(self) -> np.ndarray:
+        return self.compute_winning_position(self.current_position, self.mask)
+
+    def oppoment_winning_position(self) -> np.ndarray:
+        return self.compute_winning_position(self.current_position ^ self.mask, self.mask)
+
+    def canWinNext(self) -> np.ndarray:
+        return (self.winning_position() & self.possible()) != 0
+
+    def possible_Non_Losing_Moves(self) -> np.ndarray:
+        possible_mask = self.possible()
+        oppoment_win = self.oppoment_winning_position()
+        forced_moves = possible_mask & oppoment_win
+        has_forced = forced_moves != 0
+        many_forced = (forced_moves & (forced_moves - np.uint64(1))) != 0
+        possible_mask = np.where(has_forced, forced_moves, possible_mask)
+        result = possible_mask & ~(oppoment_win >> np.uint64(1))
+        return np.where(many_forced, np.uint64(0), result)
+
+    def moveScore(self, move) -> np.ndarray:
+        return popcount(self.compute_winning_position(self.current_position | move, self.mask))
+
+    @staticmethod
+    def compute_winning_position(position, mask):
+        # Các phép dịch của Position đều là phép toán phần tử nên dùng lại được cho mảng
+        return Position.Position.compute_winning_position(position, mask)
+
+    @staticmethod
+    def top_mask_col(col):
+        col = np.asarray(col, dtype=np.uint64)
+        return np.uint64(1) << np.uint64(Position.Position.HEIGHT - 1) << col * np.uint64(Position.Position.HEIGHT + 1)
+
+    @staticmethod
+    def bottom_mask_col(col):
+        col = np.asarray(col, dtype=np.uint64)
+        return np.uint64(1) << col * np.uint64(Position.Position.HEIGHT + 1)
+
+    @staticmethod
+    def column_mask(col):
+        col = np.asarray(col, dtype=np.uint64)
+        return ((np.uint64(1) << np.uint64(Position.Position.HEIGHT)) - np.uint64(1)) << col * np.uint64(Position.Position.HEIGHT + 1)
@@ -0,0 +1,148 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import Position
+
+
+def mirror(bitboard: int) -> int:
+    """Lật bitboard theo chiều ngang (cột c <-> cột WIDTH-1-c)"""
+    H1 = Position.Position.HEIGHT + 1
+    column = (1 << H1) - 1
+    result = 0
+    for col in range(Position.Position.WIDTH):
+        result |= ((bitboard >> col * H1) & column) << (Position.Position.WIDTH - 1 - col) * H1
+    return result
+
+
+def canonical_key(P):
+    """Trả về (khóa chuẩn, có lật hay không) - vị trí và ảnh gương dùng chung một bản ghi"""
+    current = int(P.current_position)
+    mask = int(P.mask)
+    key = current + mask
+    mirrored = mirror(current) + mirror(mask)
+    if mirrored < key:
+        return mirrored, True
+    return key, False
+
+
+class SolvedCache:
+    """
+    Cache hai tầng cho điểm chính xác của Solver: LRU trong bộ nhớ phía trước một file SQLite.
+    Mỗi bản ghi lưu điểm chính xác và nước đi tốt nhất (None nếu chưa biết) theo khóa chuẩn.
+    Thời điểm dùng gần nhất của các lần tra trúng được gom lại, và các thay đổi được commit theo lô
+    (mỗi `commit_every` lần ghi, trước khi xóa bớt và khi flush/close) thay vì một giao dịch cho mỗi lần tra.
+    """
+    def __init__(self, path: str = "solved_cache.db", memory_size: int = 4096, max_entries: int = 1000000,
+                 commit_every: int = 256):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.memory = OrderedDict()
+        self.touched = {}  # khóa -> thời điểm dùng gần nhất chưa ghi xuống đĩa
+        self.pending = 0  # số lần ghi chưa commit
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solved ("
+            "key INTEGER PRIMARY KEY, score INTEGER NOT NULL, best_move INTEGER, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS solved_last_used ON solved(last_used)")
+        self.connection.commit()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM solved").fetchone()[0]
+
+    def get(self, P):
+        """Trả về (score, best_move) hoặc None nếu chưa có"""
+        key, mirrored = canonical_key(P)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        else:
+            row = self.connection.execute("SELECT score, best_move FROM solved WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry = (row[0], row[1])
+            self._remember(key, entry)
+        self.touched[key] = time.time()
+        if len(self.touched) >= self.commit_every:
+            self.flush()
+        self.hits += 1
+        score, best_move = entry
+        if mirrored and best_move is not None:
+            best_move = Position.Position.WIDTH - 1 - best_move
+        return score, best_move
+
+    def put(self, P, score: int, best_move: Optional[int] = None) -> None:
+        key, mirrored = canonical_key(P)
+        known = self.memory.get(key)
+        if known is None:
+            row = self.connection.execute("SELECT best_move FROM solved WHERE key = ?", (key,)).fetchone()
+            known = (None, row[0]) if row is not None else None
+        if best_move is None:
+            # Không ghi đè nước đi tốt nhất đã biết
+            best_move = known[1] if known is not None else None
+        elif mirrored:
+            best_move = Position.Position.WIDTH - 1 - best_move
+        self._remember(key, (score, best_move))
+        self.touched.pop(key, None)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO solved (key, score, best_move, last_used) VALUES (?, ?, ?, ?)",
+            (key, score, best_move, time.time()))
+        self.pending += 1
+        if known is None:
+            self.count += 1
+        if self.count > self.max_entries:
+            self._evict()
+        elif self.pending >= self.commit_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Ghi các thời điểm dùng đang chờ và commit"""
+        if self.touched:
+            self.connection.executemany(
+                "UPDATE solved SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+            self.pending += 1
+        if self.pending:
+            self.connection.commit()
+            self.pending = 0
+
+    def _remember(self, key: int, entry) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Xóa các bản ghi ít dùng nhất, giữ lại 90% max_entries để không phải xóa sau mỗi lần ghi"""
+        # Cập nhật last_used trước để các vị trí hay dùng (trúng ở tầng bộ nhớ) không bị xóa
+        self.flush()
+        keep = self.max_entries * 9 // 10
+        self.connection.execute(
+            "DELETE FROM solved WHERE key IN (SELECT key FROM solved ORDER BY last_used LIMIT ?)",
+            (self.count - keep,))
+        self.connection.commit()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM solved").fetchone()[0]
+        # Bỏ khỏi bộ nhớ các khóa vừa bị xóa trên đĩa để self.count luôn khớp
+        for key in [k for k in self.memory if
+                    self.connection.execute("SELECT 1 FROM solved WHERE key = ?", (k,)).fetchone() is None]:
+            del self.memory[key]
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.touched.clear()
+        self.pending = 0
+        self.connection.execute("DELETE FROM solved")
+        self.connection.commit()
+        self.count = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.count
@@ -1,22 +1,72 @@
+import argparse
+import random
+import time
 import numpy as np
 import Position
 import MoveSorter
 import TranspositionTable
 import OpeningBook
+import ThreatAnalyzer
+import Metrics
+
+# Hằng số bitboard dạng int thuần cho tìm kiếm tàn cuộc (nhanh hơn np.uint64 trong Python)
+_H1 = Position.Position.HEIGHT + 1
+_CELLS = Position.Position.WIDTH * Position.Position.HEIGHT
+_BOTTOM = int(Position.Position.bottom_mask)
+_BOARD = int(Position.Position.board_mask)
+_COLUMNS = [((1 << Position.Position.HEIGHT) - 1) << col * _H1 for col in (3, 2, 4, 1, 5, 0, 6)]
+
+
+def _winning_cells(position, mask):
+    """Như Position.compute_winning_position nhưng trên int thuần"""
+    r = (position << 1) & (position << 2) & (position << 3)
+    for shift in (_H1, _H1 - 1, _H1 + 1):
+        p = (position << shift) & (position << 2 * shift)
+        r |= p & (position << 3 * shift)
+        r |= p & (position >> shift)
+        p = (position >> shift) & (position >> 2 * shift)
+        r |= p & (position << shift)
+        r |= p & (position >> 3 * shift)
+    return r & (_BOARD ^ mask)
+
 
 class Solver:
-    def __init__(self, max_depth = 10):
+    # |Điểm| của thắng/thua đã chứng minh khi giới hạn độ sâu: lớn hơn mọi điểm heuristic,
+    # trừ đi số nước để thắng sớm hơn (thua muộn hơn) được điểm cao hơn
+    PROVEN_SCORE = 1000
+
+    def __init__(self, max_depth = 10, threat_analysis = False, solved_cache = None, incremental_threats = True):
         self.node_count = 0
         self.max_depth = max_depth  # Độ sâu tối đa (None = không giới hạn)
+        self.threat_analysis = threat_analysis  # Chặn cửa sổ bằng claimeven_bounds; tắt mặc định vì hiếm khi cắt được nút mà tốn thời gian
+        self.incremental_threats = incremental_threats  # Đếm đe dọa tăng dần trên Position thay vì tính lại ở mỗi nút (cùng kết quả, nhanh hơn ~3 lần khi giới hạn độ sâu)
         self.column_order = [3, 2, 4, 1, 5, 0, 6]
         self.transposition_table = TranspositionTable.TranspositionTable(Position.Position.WIDTH*(Position.Position.HEIGHT + 1), self.log2(Position.Position.MAX_SCORE - Position.Position.MIN_SCORE + 1) + 1,23)  
         self.opening_book = OpeningBook.OpeningBook()
+        self.solved_cache = solved_cache  # SolvedCache, chỉ dùng khi tìm kiếm chính xác (max_depth = None)
+        self.aspiration_tries = 4  # Số null-window tối đa của MTD(f) trước khi quay về chia đôi
+        self.last_iterations = {"aspiration": 0, "bisection": 0, "test": 0}
+        self.previous_score = None  # Điểm của lần best_move trước, dùng làm guess cho nước sau
+        self.endgame_threshold = 12  # Số ô trống tối đa để chuyển sang endgame_negamax khi max_depth = None (0 = tắt)
+        self.quiescence_depth = 0  # Số nước ép tối đa được đi tiếp sau max_depth (0 = tắt, đánh giá ngay)
 
     def log2(self, n):
         if n <= 1:
             return 0
         return int(np.log2(n/2) + 1)
     
+    def win_score(self, moves):
+        """Điểm của người chơi hiện tại khi thắng ngay ở nước thứ moves + 1"""
+        if self.max_depth is None:
+            return (_CELLS + 1 - moves) // 2
+        return self.PROVEN_SCORE - moves - 1
+
+    def loss_score(self, moves):
+        """Điểm của người chơi hiện tại khi không chặn được đối thủ thắng ở nước thứ moves + 2"""
+        if self.max_depth is None:
+            return -((_CELLS - moves) // 2)
+        return moves + 2 - self.PROVEN_SCORE
+
     def add_to_book(self, sequence: str, winner: int) -> None:
         """Add a sequence to the opening book"""
         self.opening_book.add_sequence(sequence, winner)
@@ -26,11 +76,14 @@ class Solver:
         Đánh giá vị trí hiện tại bằng cách đếm các hàng 4 tiềm năng
         Trả về điểm số: (số hàng tiềm năng của người chơi) - (số hàng tiềm năng của đối thủ)
         """
-        # Kiểm tra nếu có người thắng
-        if position.is_winning_move(0):  # Giả sử 0 là cột đầu tiên, cần kiểm tra tất cả cột
-            for col in range(Position.Position.WIDTH):
-                if position.is_winning_move(col):
-                    return float('inf') if position.nb_moves() % 2 == 1 else float('-inf')
+        # Người chơi hiện tại thắng ngay ở nước sau
+        if position.canWinNext():
+            return self.win_score(position.nb_moves())
+
+        # Đếm đã được Position cập nhật tăng dần: hiệu số hàng 4 tiềm năng bên dưới luôn bằng 0
+        # (count_potential_fours chỉ xét mask) nên không cần tính lại
+        if position.line_counts is not None:
+            return 0
         
         # Tính số hàng 4 tiềm năng cho mỗi người chơi
         def count_potential_fours(pos, mask):
@@ -97,19 +150,24 @@ class Solver:
 
     def negamax(self, P, alpha, beta, depth=0):
         assert alpha < beta
+        # Chỉ khi tìm kiếm chính xác: với max_depth, tàn cuộc vẫn theo giới hạn độ sâu và hàm đánh giá như các nút khác
+        if self.max_depth is None and _CELLS - P.nb_moves() <= self.endgame_threshold:
+            return self.endgame_negamax(int(P.current_position), int(P.mask), P.nb_moves(), alpha, beta)
         self.node_count += 1
 
         # Kiểm tra điều kiện dừng theo độ sâu
         if self.max_depth is not None and depth >= self.max_depth:
+            if self.quiescence_depth:
+                return self.quiescence(P, self.quiescence_depth)
             return self.evaluate(P)
 
         possible = P.possible_Non_Losing_Moves()
         if possible == 0:
-            return -(Position.Position.WIDTH * Position.Position.HEIGHT - P.nb_moves()) // 2
+            return self.loss_score(P.nb_moves())
         if P.nb_moves() == Position.Position.WIDTH * Position.Position.HEIGHT - 2:
             return 0
 
-        min_score = -(Position.Position.WIDTH*Position.Position.HEIGHT-2 - P.nb_moves())//2
+        min_score = -((Position.Position.WIDTH*Position.Position.HEIGHT-2 - P.nb_moves())//2)
         if alpha < min_score:
             alpha = min_score
             if alpha >= beta:
@@ -121,6 +179,18 @@ class Solver:
             if alpha >= beta:
                 return beta
 
+        # Chứng minh tĩnh bằng cấu trúc zugzwang (claimeven)
+        if self.threat_analysis:
+            lower, upper = ThreatAnalyzer.claimeven_bounds(P)
+            if upper is not None and beta > upper:
+                beta = upper
+                if alpha >= beta:
+                    return beta
+            if lower is not None and alpha < lower:
+                alpha = lower
+                if alpha >= beta:
+                    return alpha
+
         key = P.key()
         val = self.transposition_table.get(key)
         if val:
@@ -149,9 +219,9 @@ class Solver:
             if next_move == 0:
                 break
 
-            P2 = Position.Position(P)
-            P2.play(next_move)
-            score = -self.negamax(P2, -beta, -alpha, depth + 1)
+            P.play(next_move)
+            score = -self.negamax(P, -beta, -alpha, depth + 1)
+            P.undo(next_move)
 
             if score >= beta:
                 # Đảm bảo giá trị nằm trong phạm vi cho phép trước khi lưu
@@ -179,18 +249,145 @@ class Solver:
         self.transposition_table.put(key, value_to_store)
         
         return best_score
-    def solve(self, P, weak=False):
+    def quiescence(self, P, remaining):
+        """
+        Tìm kiếm tĩnh ở đường chân trời: chưa đánh giá khi còn chuỗi nước ép.
+        Nhận ra thua do bị đe dọa kép và đi tiếp nước chặn bắt buộc duy nhất, tối đa `remaining` nước.
+        Kết quả đã chứng minh theo thang PROVEN_SCORE như evaluate để luôn trội hơn mọi điểm heuristic.
+        Không cần kiểm tra thắng ngay: nút cha chỉ đi nước không thua nên người chơi hiện tại không thể thắng ngay.
+        """
+        self.node_count += 1
+
+        possible = P.possible_Non_Losing_Moves()
+        if possible == 0:
+            return self.loss_score(P.nb_moves())
+        if P.nb_moves() >= Position.Position.WIDTH * Position.Position.HEIGHT - 2:
+            return 0
+
+        # Đối thủ đang đe dọa: possible chỉ còn đúng nước chặn
+        if remaining > 0 and possible & P.oppoment_winning_position():
+            P.play(possible)
+            score = -self.quiescence(P, remaining - 1)
+            P.undo(possible)
+            return score
+
+        return self.evaluate(P)
+
+    def endgame_negamax(self, current, mask, moves, alpha, beta):
+        """
+        Negamax rút gọn cho tàn cuộc: bitboard int thuần, tạo/hoàn tác nước đi bằng phép xor trên biến cục bộ,
+        thứ tự cột cố định, không bảng băm và không sắp xếp nước đi. Cho cùng kết quả với negamax.
+        """
+        self.node_count += 1
+
+        possible = (mask + _BOTTOM) & _BOARD
+        opponent_win = _winning_cells(current ^ mask, mask)
+        forced_moves = possible & opponent_win
+        if forced_moves:
+            if forced_moves & (forced_moves - 1):
+                return -((_CELLS - moves) // 2)
+            possible = forced_moves
+        possible &= ~(opponent_win >> 1)
+        if possible == 0:
+            return -((_CELLS - moves) // 2)
+        if moves == _CELLS - 2:
+            return 0
+
+        min_score = -((_CELLS - 2 - moves) // 2)
+        if alpha < min_score:
+            alpha = min_score
+            if alpha >= beta:
+                return alpha
+        max_score = (_CELLS - 1 - moves) // 2
+        if beta > max_score:
+            beta = max_score
+            if alpha >= beta:
+                return beta
+
+        opponent = current ^ mask
+        for column in _COLUMNS:
+            move = possible & column
+            if move:
+                score = -self.endgame_negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+                if score >= beta:
+                    return score
+                if score > alpha:
+                    alpha = score
+        return alpha
+
+    def exact_cache(self):
+        """Trả về solved_cache nếu điểm tìm được là chính xác, ngược lại None"""
+        return self.solved_cache if self.max_depth is None else None
+
+    def solve(self, P, weak=False, guess=None):
+        """Như _solve, đồng thời ghi thời gian, số nút và thống kê bảng băm vào Metrics"""
+        return self._measure(self._solve, P, weak, guess)
+
+    def exceeds(self, P, alpha):
+        """Như _exceeds, đồng thời ghi vào Metrics như solve"""
+        return self._measure(self._exceeds, P, alpha)
+
+    def _measure(self, search, *args):
+        start = time.perf_counter()
+        nodes = self.node_count
+        table = self.transposition_table
+        hits, misses = table.hits, table.misses
+
+        score = search(*args)
+
+        nodes = self.node_count - nodes
+        Metrics.solves.inc()
+        Metrics.nodes.inc(nodes)
+        Metrics.solve_nodes.observe(nodes)
+        Metrics.solve_seconds.observe(time.perf_counter() - start)
+        Metrics.table_hits.inc(table.hits - hits)
+        Metrics.table_misses.inc(table.misses - misses)
+        Metrics.table_fill_ratio.set(table.fill_ratio())
+        return score
+
+    def _solve(self, P, weak=False, guess=None):
+        """
+        Tìm điểm của P bằng các lần tìm kiếm null-window.
+        Nếu có `guess` (điểm ước lượng, ví dụ điểm của nước trước hoặc từ opening book) thì thử MTD(f) quanh guess trước,
+        sau `aspiration_tries` lần chưa hội tụ thì quay về chia đôi trên khoảng còn lại.
+        Số lần tìm kiếm của mỗi cách được ghi vào self.last_iterations.
+        """
+        self.last_iterations = {"aspiration": 0, "bisection": 0, "test": 0}
 
         if P.canWinNext():
-            return (Position.Position.WIDTH * Position.Position.HEIGHT + 1 - P.nb_moves()) // 2
+            return self.win_score(P.nb_moves())
+
+        cache = None if weak else self.exact_cache()
+        if cache is not None:
+            entry = cache.get(P)
+            if entry is not None:
+                return entry[0]
+
+        # negamax chơi/hoàn tác trực tiếp trên vị trí, làm việc trên bản sao để không đổi P của người gọi
+        P = Position.Position(P, track_threats=self.incremental_threats)
 
-        min_score = -(Position.Position.WIDTH * Position.Position.HEIGHT - P.nb_moves()) // 2
+        min_score = -((Position.Position.WIDTH * Position.Position.HEIGHT - P.nb_moves()) // 2)
         max_score = (Position.Position.WIDTH * Position.Position.HEIGHT + 1 - P.nb_moves()) // 2
 
         if weak:
             min_score = -1
             max_score = 1
 
+        if guess is not None:
+            # MTD(f): mỗi null-window đặt tại ước lượng hiện tại, kết quả trả về trở thành ước lượng tiếp theo
+            while min_score < max_score and self.last_iterations["aspiration"] < self.aspiration_tries:
+                med = min(max(guess, min_score), max_score - 1)
+                score = self.negamax(P, med, med + 1)
+                self.last_iterations["aspiration"] += 1
+                if abs(score) > self.PROVEN_SCORE - _CELLS:
+                    return score  # Thắng/thua đã chứng minh khi giới hạn độ sâu, trội hơn mọi điểm heuristic
+
+                if score <= med:
+                    max_score = score
+                else:
+                    min_score = score
+                guess = score
+
         while min_score < max_score:
             med = min_score + (max_score - min_score) // 2
 
@@ -202,14 +399,136 @@ class Solver:
 
             # Dùng null-window để kiểm tra xem điểm thực tế lớn hơn hay nhỏ hơn `med`
             score = self.negamax(P, med, med + 1)
+            self.last_iterations["bisection"] += 1
+            if abs(score) > self.PROVEN_SCORE - _CELLS:
+                return score
 
             if score <= med:
                 max_score = score
             else:
                 min_score = score
 
+        if cache is not None:
+            cache.put(P, min_score)
         return min_score
 
+    def _exceeds(self, P, alpha):
+        """Một null-window duy nhất: điểm của P có lớn hơn `alpha` không"""
+        if P.canWinNext():
+            return self.win_score(P.nb_moves()) > alpha
+        cache = self.exact_cache()
+        if cache is not None:
+            entry = cache.get(P)
+            if entry is not None:
+                return entry[0] > alpha
+        P = Position.Position(P, track_threats=self.incremental_threats)
+        return self.negamax(P, alpha, alpha + 1) > alpha
+
+    def new_game(self):
+        """Quên điểm của ván trước để không dùng làm guess cho một ván khác"""
+        self.previous_score = None
+
+    def best_move(self, P, guess=None):
+        """
+        Trả về cột tốt nhất (0-indexed) cho người chơi hiện tại.
+        `guess` là điểm ước lượng của P, mặc định lấy điểm của lần gọi trước trong cùng ván (cùng người chơi, hai nước trước).
+        Chỉ cột dự kiến tốt nhất (cột người chơi hiện tại vừa đi ở nước trước, theo P.get_played_sequence()) được giải
+        đầy đủ với guess; mỗi cột khác chỉ cần một null-window để xem có hơn điểm tốt nhất hiện có không,
+        và chỉ được giải đầy đủ khi hơn.
+        Sau khi gọi, self.previous_score là điểm của P và self.last_iterations là tổng số null-window của mọi cột
+        ("test" là số lần kiểm tra một null-window).
+        """
+        if guess is None:
+            guess = self.previous_score
+        iterations = {"aspiration": 0, "bisection": 0, "test": 0}
+        self.last_iterations = iterations
+        cache = self.exact_cache()
+        if cache is not None:
+            entry = cache.get(P)
+            if entry is not None and entry[1] is not None:
+                self.previous_score = entry[0]
+                return entry[1]
+
+        columns = [col for col in self.column_order if P.can_play(col)]
+        for col in columns:
+            if P.is_winning_move(col):
+                self.previous_score = self.win_score(P.nb_moves())
+                return col
+
+        sequence = P.get_played_sequence()
+        if len(sequence) >= 2 and int(sequence[-2]) - 1 in columns:
+            columns.remove(int(sequence[-2]) - 1)
+            columns.insert(0, int(sequence[-2]) - 1)
+
+        best_col = None
+        best_score = None
+        for col in columns:
+            P2 = Position.Position(P)
+            P2.playCol(col)
+            if best_col is not None:
+                # Cột này tốt hơn best_score <=> điểm của P2 (theo đối thủ) <= -best_score - 1
+                iterations["test"] += 1
+                if self.exceeds(P2, -best_score - 1):
+                    continue
+                guess = best_score + 1
+            score = -self.solve(P2, guess=None if guess is None else -guess)
+            for phase, count in self.last_iterations.items():
+                iterations[phase] += count
+            best_col = col
+            best_score = score
+        self.last_iterations = iterations
+        if best_col is not None:
+            self.previous_score = best_score
+        if cache is not None and best_col is not None:
+            cache.put(P, best_score, best_col)
+        return best_col
+
     def set_max_depth(self, depth):
         """Thiết lập độ sâu tối đa cho thuật toán"""
-        self.max_depth = depth
\ No newline at end of file
+        self.max_depth = depth
+
+
+def random_position(rng, min_moves, max_moves):
+    """Vị trí ngẫu nhiên chưa kết thúc, người chơi hiện tại không thắng ngay và còn nước không thua"""
+    while True:
+        P = Position.Position()
+        target = rng.randint(min_moves, max_moves)
+        while P.nb_moves() < target:
+            cols = [col for col in range(Position.Position.WIDTH) if P.can_play(col) and not P.is_winning_move(col)]
+            if not cols:
+                break
+            P.playCol(rng.choice(cols))
+        if P.nb_moves() == target and not P.canWinNext() and P.possible_Non_Losing_Moves() != 0:
+            return P
+
+
+def check_endgame(count, seed=0, min_moves=24, max_moves=32, threshold=12) -> int:
+    """So sánh solve có endgame_negamax (threshold) với negamax tổng quát (threshold = 0), trả về số vị trí lệch"""
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(count):
+        P = random_position(rng, min_moves, max_moves)
+        scores = []
+        for value in (threshold, 0):
+            solver = Solver(max_depth=None)
+            solver.endgame_threshold = value
+            scores.append(solver.solve(P))
+        status = "OK" if scores[0] == scores[1] else "MISMATCH"
+        mismatches += status == "MISMATCH"
+        print(f"{P.get_played_sequence():42s} endgame {scores[0]:3d}  general {scores[1]:3d}  {status}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-check of the exact Connect 4 solver")
+    parser.add_argument("--check", type=int, metavar="N", default=20,
+                        help="compare the endgame search with the general search on N random positions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=int, default=12, help="endgame_threshold to compare against 0")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    failed = check_endgame(args.check, args.seed, threshold=args.threshold)
+    print(f"{args.check - failed}/{args.check} positions agree in {time.perf_counter() - start:.2f}s")
+    if failed:
+        raise SystemExit(1)
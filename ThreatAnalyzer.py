@@ -0,0 +1,70 @@
+import numpy as np
+import Position
+
+H1 = Position.Position.HEIGHT + 1
+
+# Hàng đánh số từ 1 (dưới lên): hàng lẻ 1, 3, 5 và hàng chẵn 2, 4, 6
+odd_rows = Position.Position.bottom_mask * np.uint64(0b010101)
+even_rows = Position.Position.bottom_mask * np.uint64(0b101010)
+
+
+def has_four(position) -> bool:
+    """Kiểm tra bitboard có chứa ít nhất một hàng 4 hay không"""
+    for shift in (1, H1, H1 - 1, H1 + 1):
+        m = position & (position >> shift)
+        if m & (m >> 2 * shift):
+            return True
+    return False
+
+
+def classify_threats(P):
+    """
+    Phân loại các ô đe dọa (ô trống hoàn thành hàng 4) của mỗi bên theo tính chẵn lẻ của hàng.
+    Trả về (current_odd, current_even, opponent_odd, opponent_even) dạng bitmask.
+    """
+    current = Position.Position.compute_winning_position(P.current_position, P.mask)
+    opponent = Position.Position.compute_winning_position(P.current_position ^ P.mask, P.mask)
+    return current & odd_rows, current & even_rows, opponent & odd_rows, opponent & even_rows
+
+
+def parity_score(P) -> int:
+    """
+    Điểm đe dọa theo luật zugzwang nhìn từ người chơi hiện tại:
+    người đi trước hưởng lợi từ đe dọa hàng lẻ, người đi sau từ đe dọa hàng chẵn.
+    """
+    current_odd, current_even, opponent_odd, opponent_even = classify_threats(P)
+    if P.nb_moves() % 2 == 0:
+        return Position.Position.popcount(current_odd) - Position.Position.popcount(opponent_even)
+    return Position.Position.popcount(current_even) - Position.Position.popcount(opponent_odd)
+
+
+def claimeven_bounds(P):
+    """
+    Chặn dưới/chặn trên chắc chắn cho điểm của người chơi hiện tại dựa trên chiến lược claimeven
+    (luôn đi đè lên nước vừa rồi của đối thủ trong cùng cột). Trả về (lower, upper), None nếu không kết luận được.
+
+    - Mọi cột còn số ô trống chẵn: đối thủ dùng follow-up và chiếm mọi ô trống ở hàng chẵn,
+      người chơi hiện tại chỉ có thêm các ô hàng lẻ.
+    - Đúng một cột còn số ô trống lẻ: người chơi hiện tại đi vào cột đó rồi tự dùng follow-up.
+    """
+    empty = Position.Position.board_mask & ~P.mask
+    odd_columns = P.possible() & even_rows
+    current = P.current_position
+    opponent = P.current_position ^ P.mask
+
+    if odd_columns == 0:
+        if has_four(current | (empty & odd_rows)):
+            return None, None
+        if has_four(opponent | (empty & even_rows)):
+            return None, -1
+        return None, 0
+
+    if odd_columns & (odd_columns - np.uint64(1)) == 0:
+        empty ^= odd_columns
+        if has_four(opponent | (empty & odd_rows)):
+            return None, None
+        if has_four(current | odd_columns | (empty & even_rows)):
+            return 1, None
+        return 0, None
+
+    return None, None
@@ -44,6 +44,10 @@ class TranspositionTable:
         self.K = np.zeros(self.size, dtype=self.key_t)
         self.V = np.zeros(self.size, dtype=self.value_t)
 
+        # Thống kê: số lần tra trúng/trượt
+        self.hits = 0
+        self.misses = 0
+
     def _get_uint_type(self, bits: int) -> type:
         """Xác định kiểu numpy phù hợp cho số bit"""
         if bits <= 8:
@@ -72,12 +76,23 @@ class TranspositionTable:
         self.K[pos] = key  # Lưu key (có thể bị cắt bớt nếu key_t nhỏ hơn key_size)
         self.V[pos] = value
 
+    def fill_ratio(self) -> float:
+        """
+        Tỉ lệ ô đang giữ giá trị (V khác 0; get trả 0 cũng nghĩa là không có).
+        Quét cả bảng nên chỉ gọi sau mỗi lần solve, không gọi trong put.
+        """
+        return np.count_nonzero(self.V) / self.size
+
     def get(self, key: int) -> int:
         """Lấy giá trị từ bảng bằng key"""
         assert key >> self.key_size == 0, "Key vượt quá kích thước bit quy định"
         
         pos = self.index(key)
-        return int(self.V[pos]) if self.K[pos] == (self.key_t)(key) else 0
+        if self.K[pos] == (self.key_t)(key):
+            self.hits += 1
+            return int(self.V[pos])
+        self.misses += 1
+        return 0
 
     def __del__(self):
         """Hủy bảng khi đối tượng bị xóa"""